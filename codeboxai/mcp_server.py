@@ -6,13 +6,15 @@ This module provides the Model Context Protocol interface for CodeBox-AI.
 import asyncio
 import logging
 from contextlib import asynccontextmanager
-from typing import Any, AsyncIterator, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional
 
 from mcp.server.fastmcp import Context, FastMCP
 from mcp.types import ImageContent, TextContent
 
 from codeboxai.models import ExecutionOptions, ExecutionRequest, MountPoint
-from codeboxai.service import CodeExecutionService
+
+if TYPE_CHECKING:
+    from codeboxai.service import CodeExecutionService
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +23,7 @@ class MCPCodeService:
     """MCP interface to CodeBox-AI execution service"""
 
     def __init__(self, mount_dirs: Optional[List[str]] = None, disabled_validators: Optional[List[str]] = None):
-        self.code_service = CodeExecutionService()
+        self._code_service: Optional["CodeExecutionService"] = None
         self.active_sessions: Dict[str, Dict[str, Any]] = {}
         self.mount_dirs = mount_dirs or []
         self.disabled_validators = disabled_validators or []
@@ -35,6 +37,22 @@ class MCPCodeService:
             else:
                 logger.info(f"Disabled validators: {', '.join(self.disabled_validators)}")
 
+    @property
+    def code_service(self) -> "CodeExecutionService":
+        """Execution service, created on first use so the server can start and list tools without Docker"""
+        if self._code_service is None:
+            from codeboxai.service import CodeExecutionService
+
+            self._code_service = CodeExecutionService()
+        return self._code_service
+
+    @property
+    def sessions(self) -> Dict[str, Dict[str, Any]]:
+        """Active sessions, empty until the execution service has been started"""
+        if self._code_service is None:
+            return {}
+        return self._code_service.sessions
+
     async def _wait_for_execution(self, request_id: str, timeout: int = 60) -> Dict[str, Any]:
         """Wait for code execution to complete and return results"""
         start_time = asyncio.get_event_loop().time()
@@ -162,8 +180,8 @@ def create_mcp_server(
     @mcp.resource("session://{session_id}")
     async def get_session_info(session_id: str) -> str:
         """Get information about a specific code execution session"""
-        if session_id in mcp_service.code_service.sessions:
-            session = mcp_service.code_service.sessions[session_id]
+        if session_id in mcp_service.sessions:
+            session = mcp_service.sessions[session_id]
             return (
                 f"Session ID: {session_id}\n"
                 f"Created: {session['created_at']}\n"
@@ -175,11 +193,11 @@ def create_mcp_server(
     @mcp.resource("sessions://")
     async def list_sessions() -> str:
         """List all active code execution sessions"""
-        if not mcp_service.code_service.sessions:
+        if not mcp_service.sessions:
             return "No active sessions"
 
         result = "Active Sessions:\n\n"
-        for session_id, session in mcp_service.code_service.sessions.items():
+        for session_id, session in mcp_service.sessions.items():
             result += (
                 f"Session ID: {session_id}\n"
                 f"Created: {session['created_at']}\n"
@@ -1,117 +1,362 @@
 import ast
+import hashlib
 import logging
 import re
-from dataclasses import dataclass, field
-from functools import wraps
-from typing import Callable, Dict, List, Optional, Pattern, Set, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from functools import lru_cache, wraps
+from types import MappingProxyType
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Pattern,
+    Set,
+    Tuple,
+    cast,
+)
+
+if TYPE_CHECKING:
+    from packaging.specifiers import SpecifierSet
 
 logger = logging.getLogger(__name__)
 
-blocked_packages = {
-    # Security Sensitive
-    "crypto",  # Cryptographic operations
-    "pycrypto",  # Cryptographic operations
-    "cryptography",  # Cryptographic operations
-    "paramiko",  # SSH protocol
-    "fabric",  # SSH automation
-    "ansible",  # System automation
-    "salt",  # System automation
-    "puppet",  # System automation
-    # System Access
-    "psutil",  # System and process utilities
-    "pywin32",  # Windows system access
-    "winreg",  # Windows registry access
-    "win32com",  # Windows COM interface
-    "win32api",  # Windows API access
-    # Code Execution & Compilation
-    "pyinstaller",  # Creates executables
-    "py2exe",  # Creates executables
-    "cx_Freeze",  # Creates executables
-    "distutils",  # Package distribution
-    "pycdlib",  # ISO image manipulation
-    # Network & Server
-    "django",  # Web framework
-    "flask",  # Web framework
-    "fastapi",  # Web framework
-    "tornado",  # Web framework
-    "twisted",  # Network framework
-    "socketserver",  # Network servers
-    "ftplib",  # FTP protocol
-    "smtplib",  # Email sending
-    # System Shell & Commands
-    "sh",  # Shell commands
-    "shellingham",  # Shell detection
-    "pexpect",  # Process control
-    "pyshell",  # Shell interface
-    # Low-level System Access
-    "ctypes",  # C-compatible data types
-    "cffi",  # Foreign function interface
-    "mmap",  # Memory mapping
-    # Remote Code & Debuggers
-    "code",  # Code module
-    "pdb",  # Python debugger
-    "rpdb",  # Remote debugger
-    "ipdb",  # IPython debugger
-    "pyrasite",  # Process injection
-    # Other Potentially Dangerous
-    "docker",  # Docker control
-    "kubernetes",  # Kubernetes control
-    "boto3",  # AWS SDK
-    "azure",  # Azure SDK
-    "google-cloud",  # GCP SDK
-}
-
-
-@dataclass
+# Package names are compared in canonical PEP 503 form, however they are spelled in install commands
+blocked_packages = frozenset(
+    {
+        # Security Sensitive
+        "crypto",  # Cryptographic operations
+        "pycrypto",  # Cryptographic operations
+        "cryptography",  # Cryptographic operations
+        "paramiko",  # SSH protocol
+        "fabric",  # SSH automation
+        "ansible",  # System automation
+        "salt",  # System automation
+        "puppet",  # System automation
+        # System Access
+        "psutil",  # System and process utilities
+        "pywin32",  # Windows system access
+        "winreg",  # Windows registry access
+        "win32com",  # Windows COM interface
+        "win32api",  # Windows API access
+        # Code Execution & Compilation
+        "pyinstaller",  # Creates executables
+        "py2exe",  # Creates executables
+        "cx_freeze",  # Creates executables
+        "distutils",  # Package distribution
+        "pycdlib",  # ISO image manipulation
+        # Network & Server
+        "django",  # Web framework
+        "flask",  # Web framework
+        "fastapi",  # Web framework
+        "tornado",  # Web framework
+        "twisted",  # Network framework
+        "socketserver",  # Network servers
+        "ftplib",  # FTP protocol
+        "smtplib",  # Email sending
+        # System Shell & Commands
+        "sh",  # Shell commands
+        "shellingham",  # Shell detection
+        "pexpect",  # Process control
+        "pyshell",  # Shell interface
+        # Low-level System Access
+        "ctypes",  # C-compatible data types
+        "cffi",  # Foreign function interface
+        "mmap",  # Memory mapping
+        # Remote Code & Debuggers
+        "code",  # Code module
+        "pdb",  # Python debugger
+        "rpdb",  # Remote debugger
+        "ipdb",  # IPython debugger
+        "pyrasite",  # Process injection
+        # Other Potentially Dangerous
+        "docker",  # Docker control
+        "kubernetes",  # Kubernetes control
+        "boto3",  # AWS SDK
+        "azure",  # Azure SDK
+        "google-cloud",  # GCP SDK
+    }
+)
+
+FORBIDDEN_BUILTINS = frozenset(
+    {
+        "eval",
+        "exec",
+        "globals",
+        "locals",
+        "compile",
+        "__import__",
+    }
+)
+
+FORBIDDEN_MODULES = frozenset(
+    {
+        "sys",
+        "subprocess",
+        "multiprocessing",
+        "socket",
+        "pickle",
+        "marshal",
+        "shelve",
+        "pty",
+        "pdb",
+    }
+)
+
+ALLOWED_SHELL_COMMANDS = frozenset(
+    {
+        "pip",
+        "conda",
+        "jupyter",
+        "python",
+        "pytest",
+        "black",
+        "flake8",
+        "mypy",
+        "curl",
+        "wget",
+    }
+)
+
+# Dunder names such as __class__ or __globals__, outside of shell and magic commands
+_DUNDER_RE = re.compile(r"(?<![\!%])__\w+__")
+
+# Jupyter shell command (!), line magic (%) and cell magic (%%) lines
+_JUPYTER_PREFIXES = ("!", "%")
+
+# First word of each shell command line, found without splitting the code into lines
+_SHELL_COMMAND_RE = re.compile(r"^[^\S\n]*![^\S\n]*(\S*)", re.MULTILINE)
+
+# pip, pip3, python -m pip and conda install commands, capturing the package list
+_PACKAGE_INSTALL_RE = re.compile(
+    r"!(?:(?:python\s+-m\s+)?pip(?:3)?|conda)\s+install\s+([-\w\d\s,\.=<>]+)",
+    re.MULTILINE,
+)
+
+# One requirement such as "pillow>=9.0.0" in an install command: the name up to the
+# first comparison operator, then the rest of the requirement as its version specifier
+_REQUIREMENT_RE = re.compile(r"(?=\S)([^\s<>=!]*)(\S*)")
+
+# Runs of separators that PEP 503 treats as equivalent in package names
+_PACKAGE_NAME_SEPARATORS_RE = re.compile(r"[-_.]+")
+
+# Substrings that the default rules need to reject anything: imports, shell commands and magics,
+# and dunder names. Together with the forbidden builtin names, code without any of them always passes
+_TRIGGER_TOKENS = ("import", "!", "%", "__")
+
+# Rules that validate Jupyter shell and magic lines rather than Python source
+_JUPYTER_RULES = frozenset({"jupyter_commands", "package_installation"})
+
+# Number of validation results kept per validator for re-submitted code
+_RESULTS_CACHE_SIZE = 1024
+
+# Code longer than this is cached under a digest to bound the memory held by the cache
+_CACHE_DIGEST_THRESHOLD = 4096
+
+_PASSED = (True, "Code validation passed")
+
+
+# Marks the end of a stored name in a _ModuleTrie node; never a valid module name segment
+_TRIE_END = ""
+
+
+class _ModuleTrie:
+    """Prefix tree over dotted module names, walked one name segment at a time"""
+
+    def __init__(self, names: Iterable[str]):
+        self._root: Dict[str, dict] = {}
+        for name in names:
+            node = self._root
+            for part in name.split("."):
+                node = node.setdefault(part, {})
+            node[_TRIE_END] = {}
+
+    def matches_prefix(self, name: str) -> bool:
+        """Returns True if the module or one of its parent packages is stored in the trie"""
+        node = self._root
+        for part in name.split("."):
+            child = node.get(part)
+            if child is None:
+                return False
+            node = child
+            if _TRIE_END in node:
+                return True
+        return False
+
+
+@lru_cache(maxsize=8)
+def _module_trie(names: FrozenSet[str]) -> _ModuleTrie:
+    """Builds the trie for a set of forbidden modules once and shares it between validators"""
+    return _ModuleTrie(names)
+
+
+class _Violation(Exception):
+    """Raised by a _FirstViolationVisitor to stop the traversal, carrying the error message"""
+
+
+class _FirstViolationVisitor(ast.NodeVisitor):
+    """AST visitor that stops at the first violation instead of walking the whole tree"""
+
+    def find(self, tree: ast.AST) -> Optional[str]:
+        """Returns the message for the first violation in the tree, or None"""
+        try:
+            self.visit(tree)
+        except _Violation as violation:
+            return str(violation)
+        return None
+
+
+class _BuiltinCallVisitor(_FirstViolationVisitor):
+    """Finds calls to forbidden builtins by name"""
+
+    def __init__(self, forbidden: FrozenSet[str]):
+        self.forbidden = forbidden
+
+    def visit_Call(self, node: ast.Call) -> None:
+        if isinstance(node.func, ast.Name) and node.func.id in self.forbidden:
+            raise _Violation(f"Forbidden function call: {node.func.id}")
+        self.generic_visit(node)
+
+
+class _ImportVisitor(_FirstViolationVisitor):
+    """Finds imports of forbidden modules; import nodes have no children worth visiting"""
+
+    def __init__(self, forbidden: _ModuleTrie):
+        self.forbidden = forbidden
+
+    def visit_Import(self, node: ast.Import) -> None:
+        for name in node.names:
+            if self.forbidden.matches_prefix(name.name):
+                raise _Violation(f"Forbidden import: {name.name}")
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        if node.module and self.forbidden.matches_prefix(node.module):
+            raise _Violation(f"Forbidden import: {node.module}")
+
+
+@lru_cache(maxsize=1024)
+def _canonical_package_name(name: str) -> str:
+    """Normalizes a package name as pip does (PEP 503), so spellings like Cx_Freeze and cx-freeze compare equal"""
+    return _PACKAGE_NAME_SEPARATORS_RE.sub("-", name).lower()
+
+
+@lru_cache(maxsize=None)
+def _allowed_specifier_set(spec: str) -> "SpecifierSet":
+    """Parse a configured version specifier once and reuse it across validations"""
+    from packaging import specifiers
+
+    return specifiers.SpecifierSet(spec)
+
+
+# Rules are immutable, so validators only see rule changes made through their own methods
+@dataclass(frozen=True, slots=True)
 class ValidationRule:
     name: str
     description: str
     enabled: bool = True
     validation_fn: Optional[Callable[[str], Tuple[bool, Optional[str]]]] = None
+    # Check on an already parsed tree, so validate_code can parse once for all AST-based rules
+    ast_validation_fn: Optional[Callable[[ast.AST], Tuple[bool, Optional[str]]]] = None
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class PackageValidationRule(ValidationRule):
-    allowed_packages: Set[str] = field(default_factory=set)
-    blocked_packages: Set[str] = field(default_factory=set)
+    allowed_packages: FrozenSet[str] = frozenset()
+    blocked_packages: FrozenSet[str] = frozenset()
+    # Keyed by canonical package name
     allowed_versions: Dict[str, Set[str]] = field(default_factory=dict)
 
+    def __post_init__(self) -> None:
+        # Configured names are canonicalized once so lookups match any spelling of the name
+        object.__setattr__(self, "allowed_packages", frozenset(map(_canonical_package_name, self.allowed_packages)))
+        object.__setattr__(self, "blocked_packages", frozenset(map(_canonical_package_name, self.blocked_packages)))
+        object.__setattr__(
+            self,
+            "allowed_versions",
+            {_canonical_package_name(name): versions for name, versions in self.allowed_versions.items()},
+        )
+
 
-def ast_rule(f: Callable) -> Callable:
-    """Decorator to handle AST parsing for rules that need it"""
+def ast_rule(
+    f: Callable[[ast.AST], Tuple[bool, Optional[str]]],
+) -> Callable[[str], Tuple[bool, Optional[str]]]:
+    """Wraps an AST-based check so it can also be called with source code"""
 
     @wraps(f)
-    def wrapper(self, code: str) -> Tuple[bool, Optional[str]]:
+    def wrapper(code: str) -> Tuple[bool, Optional[str]]:
         try:
             tree = ast.parse(code)
-            return f(self, tree)
         except SyntaxError as e:
             return False, f"Invalid Python syntax: {str(e)}"
+        return f(tree)
 
     return wrapper
 
 
+@lru_cache(maxsize=1)
+def get_default_validator() -> "CodeValidator":
+    """
+    Get the shared CodeValidator with all rules enabled
+
+    The instance is built once and reused across requests, so it cannot be
+    reconfigured: enable_rule, disable_rule, set_rule and assigning the forbidden
+    or allowed tables raise RuntimeError, and its rules are read-only. Create a
+    CodeValidator to customize validation.
+
+    Returns:
+        The shared CodeValidator instance
+    """
+    validator = CodeValidator()
+    validator._freeze()
+    return validator
+
+
+# Validators handed out by create_validator_with_disabled_rules, keyed by their disabled rules
+_VALIDATOR_CACHE: Dict[FrozenSet[str], "CodeValidator"] = {}
+
+
 def create_validator_with_disabled_rules(disabled_rules: Optional[List[str]] = None) -> "CodeValidator":
     """
-    Factory function to create a new CodeValidator with specific rules disabled
+    Factory function to get a CodeValidator with specific rules disabled
+
+    Validators are cached per set of disabled rules and shared between callers,
+    so the returned instance cannot be reconfigured: enable_rule, disable_rule,
+    set_rule and assigning the forbidden or allowed tables raise RuntimeError,
+    and its rules are read-only.
 
     Args:
         disabled_rules: List of rule names to disable, or ["all"] to disable all validation
 
     Returns:
-        A configured CodeValidator instance
+        A configured CodeValidator instance, or the shared default validator if no rules are disabled
     """
-    validator = CodeValidator()
+    if not disabled_rules:
+        return get_default_validator()
+
+    known_rules = get_default_validator().rules_lookup.keys()
+    if "all" in disabled_rules:
+        key = frozenset(known_rules)
+    else:
+        for rule_name in set(disabled_rules) - known_rules:
+            logger.warning(f"Attempted to disable unknown validation rule: {rule_name}")
+        # Only known rule names go into the key, so arbitrary input cannot grow the cache
+        key = frozenset(disabled_rules).intersection(known_rules)
 
-    if disabled_rules:
-        if "all" in disabled_rules:
-            # Disable all rules
-            for rule in validator.rules:
-                validator.disable_rule(rule.name)
-        else:
-            # Disable specific rules
-            for rule_name in disabled_rules:
-                validator.disable_rule(rule_name)
+    if not key:
+        return get_default_validator()
+
+    validator = _VALIDATOR_CACHE.get(key)
+    if validator is None:
+        validator = CodeValidator()
+        for rule_name in key:
+            validator.disable_rule(rule_name)
+        validator._freeze()
+        _VALIDATOR_CACHE[key] = validator
 
     return validator
 
@@ -119,58 +364,95 @@ def create_validator_with_disabled_rules(disabled_rules: Optional[List[str]] = N
 class CodeValidator:
     """Validates Python code for security concerns while allowing Jupyter/IPython syntax"""
 
-    def __init__(self):
-        # Initialize base security rules
-        self.forbidden_builtins: Set[str] = {
-            "eval",
-            "exec",
-            "globals",
-            "locals",
-            "compile",
-            "__import__",
-        }
-
-        self.forbidden_modules: Set[str] = {
-            "sys",
-            "subprocess",
-            "multiprocessing",
-            "socket",
-            "pickle",
-            "marshal",
-            "shelve",
-            "pty",
-            "pdb",
-        }
-
-        self.forbidden_patterns: List[Pattern] = [
-            re.compile(r"(?<![\!%])__\w+__"),
-        ]
+    def __init__(self) -> None:
+        # Set on validators shared between callers, which must not be reconfigured
+        self._frozen = False
 
-        self.jupyter_patterns: List[Pattern] = [
-            re.compile(r"^\s*!.*$", re.MULTILINE),  # Shell commands
-            re.compile(r"^\s*%.*$", re.MULTILINE),  # Line magic
-            re.compile(r"^\s*%%.*$", re.MULTILINE),  # Cell magic
-        ]
+        # Most recently validated code and its result. Changing the rules or any of the
+        # settings below drops the cached results
+        self._results_cache: "OrderedDict[object, Tuple[bool, str]]" = OrderedDict()
 
-        self.allowed_shell_commands: Set[str] = {
-            "pip",
-            "conda",
-            "jupyter",
-            "python",
-            "pytest",
-            "black",
-            "flake8",
-            "mypy",
-            "curl",
-            "wget",
-        }
+        # Initialize base security rules, shared by all validators
+        self.forbidden_builtins = FORBIDDEN_BUILTINS
+        self.forbidden_modules = FORBIDDEN_MODULES
+        self.forbidden_patterns = (_DUNDER_RE,)
+        self.allowed_shell_commands = ALLOWED_SHELL_COMMANDS
 
         # Initialize validation rules
         self._initialize_rules()
 
-    def _initialize_rules(self):
+    @property
+    def forbidden_builtins(self) -> FrozenSet[str]:
+        """Builtin functions that code must not call"""
+        return self._forbidden_builtins
+
+    @forbidden_builtins.setter
+    def forbidden_builtins(self, names: Iterable[str]) -> None:
+        self._check_not_frozen()
+        self._forbidden_builtins = frozenset(names)
+        self._results_cache.clear()
+
+    @property
+    def forbidden_modules(self) -> FrozenSet[str]:
+        """Modules that code must not import, together with their submodules"""
+        return self._forbidden_modules
+
+    @forbidden_modules.setter
+    def forbidden_modules(self, names: Iterable[str]) -> None:
+        self._check_not_frozen()
+        self._forbidden_modules = frozenset(names)
+        self._results_cache.clear()
+
+    @property
+    def forbidden_patterns(self) -> Tuple[Pattern, ...]:
+        """Patterns that must not be found in the Python code"""
+        return self._forbidden_patterns
+
+    @forbidden_patterns.setter
+    def forbidden_patterns(self, patterns: Iterable[Pattern]) -> None:
+        self._check_not_frozen()
+        self._forbidden_patterns = tuple(patterns)
+        # Patterns with groups are searched on their own, since an alternation renumbers their backreferences
+        self._combined_patterns = tuple(pattern for pattern in self._forbidden_patterns if not pattern.groups)
+        self._combined_patterns_re = self._combine_patterns(self._combined_patterns)
+        if self._combined_patterns_re is None:
+            self._combined_patterns = ()
+        self._separate_patterns = tuple(
+            pattern for pattern in self._forbidden_patterns if pattern not in self._combined_patterns
+        )
+        self._results_cache.clear()
+
+    @property
+    def allowed_shell_commands(self) -> FrozenSet[str]:
+        """Commands that Jupyter shell lines may run"""
+        return self._allowed_shell_commands
+
+    @allowed_shell_commands.setter
+    def allowed_shell_commands(self, names: Iterable[str]) -> None:
+        self._check_not_frozen()
+        self._allowed_shell_commands = frozenset(names)
+        self._results_cache.clear()
+
+    def _freeze(self) -> None:
+        """Marks the validator as shared, so reconfiguring it raises instead of affecting other callers"""
+        self._frozen = True
+        # Rules are immutable apart from the package version requirements, made read-only here
+        for rule in self._rules:
+            if isinstance(rule, PackageValidationRule):
+                object.__setattr__(
+                    rule,
+                    "allowed_versions",
+                    MappingProxyType({name: frozenset(versions) for name, versions in rule.allowed_versions.items()}),
+                )
+
+    def _check_not_frozen(self) -> None:
+        """Raises if the validator is shared and must not be reconfigured"""
+        if self._frozen:
+            raise RuntimeError("Shared validators cannot be reconfigured, create a CodeValidator instead")
+
+    def _initialize_rules(self) -> None:
         """Initialize the validation rules"""
-        self.rules: List[ValidationRule] = [
+        rules: List[ValidationRule] = [
             ValidationRule(
                 name="jupyter_commands",
                 description="Validate Jupyter magic and shell commands",
@@ -179,12 +461,14 @@ class CodeValidator:
             ValidationRule(
                 name="dangerous_builtins",
                 description="Prevent use of dangerous built-in functions",
-                validation_fn=self._validate_builtins,
+                validation_fn=ast_rule(self._validate_builtins),
+                ast_validation_fn=self._validate_builtins,
             ),
             ValidationRule(
                 name="dangerous_imports",
                 description="Prevent importing of dangerous modules",
-                validation_fn=self._validate_imports,
+                validation_fn=ast_rule(self._validate_imports),
+                ast_validation_fn=self._validate_imports,
             ),
             ValidationRule(
                 name="dangerous_patterns",
@@ -194,12 +478,12 @@ class CodeValidator:
         ]
 
         # Add package validation rule
-        self.rules.append(
+        rules.append(
             PackageValidationRule(
                 name="package_installation",
                 description="Validate package installation commands",
                 validation_fn=self._validate_package_installation,
-                allowed_packages=set(),  # Empty - allow all except blocked
+                allowed_packages=frozenset(),  # Empty - allow all except blocked
                 blocked_packages=blocked_packages,
                 allowed_versions={
                     # Set minimum versions for security
@@ -215,19 +499,55 @@ class CodeValidator:
             )
         )
 
-        # Create a rules lookup for easy access
-        self.rules_lookup: Dict[str, ValidationRule] = {rule.name: rule for rule in self.rules}
+        self._builtin_checks = tuple((rule.validation_fn, rule.ast_validation_fn) for rule in rules)
+        self._set_rules(rules)
+
+    @property
+    def rules(self) -> Tuple[ValidationRule, ...]:
+        """The validation rules in the order they run"""
+        return self._rules
+
+    @property
+    def rules_lookup(self) -> Mapping[str, ValidationRule]:
+        """Read-only view of the validation rules by name"""
+        return self._rules_lookup
+
+    def _set_rules(self, rules: Iterable[ValidationRule]) -> None:
+        """Installs the rules, precomputing the enabled ones and dropping the results cached with the previous rules"""
+        self._rules = tuple(rules)
+        self._rules_lookup = MappingProxyType({rule.name: rule for rule in self._rules})
+        self._active_rules = tuple(rule for rule in self._rules if rule.enabled)
+        # The prefilter tokens only cover the built-in checks, not added or replaced ones
+        self._prefilter = all(
+            (rule.validation_fn, rule.ast_validation_fn) in self._builtin_checks for rule in self._active_rules
+        )
+        self._results_cache.clear()
+
+    def set_rule(self, rule: ValidationRule) -> None:
+        """
+        Add a validation rule, or replace the rule with the same name
+
+        Rules are immutable, so a rule is reconfigured by replacing it, for example with
+        dataclasses.replace(validator.rules_lookup[name], blocked_packages=...).
+        """
+        self._check_not_frozen()
+        rules = [rule if existing.name == rule.name else existing for existing in self._rules]
+        if rule.name not in self._rules_lookup:
+            rules.append(rule)
+        self._set_rules(rules)
 
-    def enable_rule(self, rule_name: str):
+    def enable_rule(self, rule_name: str) -> None:
         """Enable a specific validation rule"""
+        self._check_not_frozen()
         if rule_name in self.rules_lookup:
-            self.rules_lookup[rule_name].enabled = True
+            self.set_rule(replace(self.rules_lookup[rule_name], enabled=True))
             logger.debug(f"Enabled validation rule: {rule_name}")
 
-    def disable_rule(self, rule_name: str):
+    def disable_rule(self, rule_name: str) -> None:
         """Disable a specific validation rule"""
+        self._check_not_frozen()
         if rule_name in self.rules_lookup:
-            self.rules_lookup[rule_name].enabled = False
+            self.set_rule(replace(self.rules_lookup[rule_name], enabled=False))
             logger.debug(f"Disabled validation rule: {rule_name}")
         else:
             logger.warning(f"Attempted to disable unknown validation rule: {rule_name}")
@@ -238,110 +558,114 @@ class CodeValidator:
         if not isinstance(package_rule, PackageValidationRule):
             return True, None
 
-        # Regular expressions to match different installation patterns
-        pip_patterns = [
-            r"!(?:python\s+-m\s+)?pip(?:3)?\s+install\s+([-\w\d\s,\.=<>]+)",
-            r"!conda\s+install\s+([-\w\d\s,\.=<>]+)",
-        ]
-
-        for pattern in pip_patterns:
-            matches = re.finditer(pattern, code, re.MULTILINE)
-            for match in matches:
-                packages_str = match.group(1)
-                packages = [p.strip() for p in packages_str.split() if p.strip()]
-
-                for package in packages:
-                    # Split package name and version specifier
-                    parts = re.split(r"(>=|<=|==|>|<|!=)", package)
-                    package_name = parts[0]
-                    version_spec = "".join(parts[1:]) if len(parts) > 1 else None
-
-                    # Check if package is blocked
-                    if package_name.lower() in package_rule.blocked_packages:
-                        return False, f"Package {package_name} is blocked for security reasons"
-
-                    # If we have an allowlist and package isn't in it
-                    if package_rule.allowed_packages and package_name not in package_rule.allowed_packages:
-                        return False, f"Package {package_name} is not in the allowed packages list"
-
-                    # Check version constraints if they exist for this package
-                    if version_spec and package_name in package_rule.allowed_versions:
-                        from packaging import specifiers, version
-
-                        try:
-                            allowed = specifiers.SpecifierSet(",".join(package_rule.allowed_versions[package_name]))
-
-                            # For exact versions, directly check if they satisfy the allowed specifier
-                            if "==" in version_spec:
-                                ver = version.Version(version_spec.split("==")[1])
-                                if not allowed.contains(ver):
+        for match in _PACKAGE_INSTALL_RE.finditer(code):
+            for requirement in _REQUIREMENT_RE.finditer(match.group(1)):
+                package_name, version_spec = requirement.groups()
+                canonical_name = _canonical_package_name(package_name)
+
+                # conda pins a version with a single "="
+                if version_spec.startswith("=") and not version_spec.startswith("=="):
+                    version_spec = "=" + version_spec
+
+                # Check if package is blocked
+                if canonical_name in package_rule.blocked_packages:
+                    return False, f"Package {package_name} is blocked for security reasons"
+
+                # If we have an allowlist and package isn't in it
+                if package_rule.allowed_packages and canonical_name not in package_rule.allowed_packages:
+                    return False, f"Package {package_name} is not in the allowed packages list"
+
+                # Check version constraints if they exist for this package
+                if version_spec and canonical_name in package_rule.allowed_versions:
+                    from packaging import specifiers, version
+
+                    try:
+                        allowed = _allowed_specifier_set(
+                            ",".join(sorted(package_rule.allowed_versions[canonical_name]))
+                        )
+
+                        # For exact versions, directly check if they satisfy the allowed specifier
+                        if "==" in version_spec:
+                            ver = version.Version(version_spec.split("==")[1])
+                            if not allowed.contains(ver):
+                                return (
+                                    False,
+                                    f"Version {ver} of {package_name} is not allowed. Must satisfy: {allowed}",
+                                )
+                        else:
+                            # For range specifications, check against minimum allowed version
+                            requested = specifiers.SpecifierSet(version_spec)
+                            min_allowed = None
+                            for spec in allowed:
+                                if ">=" in str(spec):
+                                    min_allowed = str(spec).replace(">=", "")
+                                    break
+
+                            if min_allowed:
+                                min_ver = version.Version(min_allowed)
+                                test_ver = version.Version(str(min_ver.major) + "." + str(min_ver.minor))
+                                if test_ver < min_ver and requested.contains(test_ver):
                                     return (
                                         False,
-                                        f"Version {ver} of {package_name} is not allowed. Must satisfy: {allowed}",
+                                        f"Version {version_spec} of {package_name} would allow "
+                                        f"versions below minimum required ({min_allowed}). "
+                                        f"Must satisfy: {allowed}",
                                     )
-                            else:
-                                # For range specifications, check against minimum allowed version
-                                requested = specifiers.SpecifierSet(version_spec)
-                                min_allowed = None
-                                for spec in allowed:
-                                    if ">=" in str(spec):
-                                        min_allowed = str(spec).replace(">=", "")
-                                        break
-
-                                if min_allowed:
-                                    min_ver = version.Version(min_allowed)
-                                    test_ver = version.Version(str(min_ver.major) + "." + str(min_ver.minor))
-                                    if test_ver < min_ver and requested.contains(test_ver):
-                                        return (
-                                            False,
-                                            f"Version {version_spec} of {package_name} would allow "
-                                            f"versions below minimum required ({min_allowed}). "
-                                            f"Must satisfy: {allowed}",
-                                        )
-
-                        except Exception as e:
-                            return False, f"Invalid version specification for {package_name}: {str(e)}"
+
+                    except Exception as e:
+                        return False, f"Invalid version specification for {package_name}: {str(e)}"
 
         return True, None
 
     def _validate_jupyter_commands(self, code: str) -> Tuple[bool, Optional[str]]:
         """Validates Jupyter shell commands for safety"""
-        shell_lines = [line.strip() for line in code.split("\n") if line.strip().startswith("!")]
-
-        for line in shell_lines:
-            command = line[1:].strip().split()[0]  # Get first word after !
+        for match in _SHELL_COMMAND_RE.finditer(code):
+            command = match.group(1)
             if command not in self.allowed_shell_commands:
                 return False, f"Shell command not allowed: {command}"
 
         return True, None
 
-    @ast_rule
     def _validate_builtins(self, tree: ast.AST) -> Tuple[bool, Optional[str]]:
         """Validates that no dangerous builtins are used"""
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
-                if node.func.id in self.forbidden_builtins:
-                    return False, f"Forbidden function call: {node.func.id}"
-        return True, None
+        message = _BuiltinCallVisitor(self.forbidden_builtins).find(tree)
+        return message is None, message
 
-    @ast_rule
     def _validate_imports(self, tree: ast.AST) -> Tuple[bool, Optional[str]]:
         """Validates that no dangerous imports are used"""
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Import):
-                for name in node.names:
-                    base_module = name.name.split(".")[0]
-                    if base_module in self.forbidden_modules:
-                        return False, f"Forbidden import: {name.name}"
-
-            elif isinstance(node, ast.ImportFrom):
-                if node.module and node.module.split(".")[0] in self.forbidden_modules:
-                    return False, f"Forbidden import: {node.module}"
-        return True, None
+        message = _ImportVisitor(_module_trie(self.forbidden_modules)).find(tree)
+        return message is None, message
+
+    @staticmethod
+    def _combine_patterns(patterns: Tuple[Pattern, ...]) -> Optional[Pattern]:
+        """
+        Combines forbidden patterns without groups into one alternation, built when the patterns are set
+
+        Returns:
+            The combined pattern with one named group per forbidden pattern, or None if the
+            patterns use different flags or cannot be embedded, and must be searched one by one
+        """
+        if not patterns or len({pattern.flags for pattern in patterns}) != 1:
+            return None
+        try:
+            return re.compile(
+                "|".join(f"(?P<_p{i}>{pattern.pattern})" for i, pattern in enumerate(patterns)),
+                patterns[0].flags,
+            )
+        except re.error:
+            # Inline global flags such as (?i) are only allowed at the start of a pattern
+            return None
 
     def _validate_patterns(self, code: str) -> Tuple[bool, Optional[str]]:
         """Validates that no dangerous patterns are found in the code"""
-        for pattern in self.forbidden_patterns:
+        combined = self._combined_patterns_re
+        if combined is not None:
+            match = combined.search(code)
+            if match:
+                pattern = self._combined_patterns[int(cast(str, match.lastgroup)[2:])]
+                return False, f"Forbidden pattern found: {pattern.pattern}"
+
+        for pattern in self._separate_patterns:
             if pattern.search(code):
                 return False, f"Forbidden pattern found: {pattern.pattern}"
         return True, None
@@ -356,32 +680,122 @@ class CodeValidator:
         Returns:
             Tuple of (is_valid, message)
         """
-        failures = []
+        if not self._active_rules or not code or code.isspace() or not self._may_fail(code):
+            return _PASSED
+
+        key = self._cache_key(code)
+        result = self._results_cache.get(key)
+        if result is not None:
+            self._results_cache.move_to_end(key)
+            return result
+
+        result = self._run_rules(code)
+
+        # Version requirements can be edited in place, so verdicts on install commands are not kept
+        if _PACKAGE_INSTALL_RE.search(code) is not None:
+            return result
+
+        self._results_cache[key] = result
+        if len(self._results_cache) > _RESULTS_CACHE_SIZE:
+            self._results_cache.popitem(last=False)
+        return result
+
+    def validate_many(self, codes: Iterable[str]) -> List[Tuple[bool, str]]:
+        """
+        Validates a batch of code snippets, validating identical snippets only once
+
+        Args:
+            codes: The Python code snippets to validate
+
+        Returns:
+            List of (is_valid, message) tuples in the same order as the input
+        """
+        results: Dict[str, Tuple[bool, str]] = {}
+        validated = []
+        for code in codes:
+            result = results.get(code)
+            if result is None:
+                result = results[code] = self.validate_code(code)
+            validated.append(result)
+        return validated
+
+    def _may_fail(self, code: str) -> bool:
+        """
+        Cheap substring scan run before the full rule pipeline
+
+        Python normalizes non-ASCII identifiers (NFKC), so only ASCII code can be cleared
+        this way, and only while the rules and forbidden patterns are the defaults the tokens cover.
+        Syntax errors in cleared code are left for the kernel to report.
+
+        Returns:
+            False if no rule can reject the code, True if the rules must run
+        """
+        if not self._prefilter or not code.isascii() or self.forbidden_patterns != (_DUNDER_RE,):
+            return True
+        return any(token in code for token in _TRIGGER_TOKENS) or any(name in code for name in self.forbidden_builtins)
+
+    def _cache_key(self, code: str) -> object:
+        """Builds the results cache key from the code, or its digest for large code"""
+        if len(code) > _CACHE_DIGEST_THRESHOLD:
+            return hashlib.blake2b(code.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        return code
+
+    @staticmethod
+    def _split(code: str) -> Tuple[str, str]:
+        """
+        Splits code into Python source and Jupyter shell/magic lines in a single pass
+
+        Returns:
+            Tuple of (python_source, jupyter_source)
+        """
+        if "!" not in code and "%" not in code:
+            return code, ""
 
-        # Split code into Jupyter commands and Python code
         python_code = []
         jupyter_commands = []
-
         for line in code.split("\n"):
-            is_jupyter = any(pattern.match(line.strip()) for pattern in self.jupyter_patterns)
-            if is_jupyter:
+            if line.lstrip().startswith(_JUPYTER_PREFIXES):
                 jupyter_commands.append(line)
             else:
                 python_code.append(line)
+        return "\n".join(python_code), "\n".join(jupyter_commands)
+
+    def _run_rules(self, code: str) -> Tuple[bool, str]:
+        """Runs all enabled validation rules against the code"""
+        failures = []
+
+        python_source, jupyter_source = self._split(code)
+        tree: Optional[ast.AST] = None
+        parsed = False
 
         # Run enabled validation rules
-        for rule in self.rules:
-            if rule.enabled:
-                # Run Jupyter command validation on full code
-                if rule.name == "jupyter_commands" or rule.name == "package_installation":
-                    is_valid, message = rule.validation_fn(code)
-                # Run other validations only on Python code parts
-                else:
-                    is_valid, message = rule.validation_fn("\n".join(python_code))
-
-                if not is_valid and message:
-                    failures.append(message)
+        for rule in self._active_rules:
+
+            # Run AST-based rules on a tree parsed once from the Python code parts
+            if rule.ast_validation_fn is not None:
+                if not parsed:
+                    parsed = True
+                    try:
+                        tree = ast.parse(python_source)
+                    except SyntaxError as e:
+                        failures.append(f"Invalid Python syntax: {str(e)}")
+                if tree is None:
+                    continue
+                is_valid, message = rule.ast_validation_fn(tree)
+            elif rule.validation_fn is None:
+                continue
+            # Run Jupyter command validation only on shell and magic lines
+            elif rule.name in _JUPYTER_RULES:
+                if not jupyter_source:
+                    continue
+                is_valid, message = rule.validation_fn(jupyter_source)
+            # Run other validations only on Python code parts
+            else:
+                is_valid, message = rule.validation_fn(python_source)
+
+            if not is_valid and message:
+                failures.append(message)
 
         if failures:
             return False, "; ".join(failures)
-        return True, "Code validation passed"
+        return _PASSED
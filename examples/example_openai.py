@@ -31,13 +31,15 @@ class CodeBoxSession:
     """Manages a CodeBox-AI session"""
 
     def __init__(self, dependencies: Optional[List[str]] = None, execution_options: Optional[Dict[str, Any]] = None):
+        # Keep-alive connection reused for the create/execute/poll/cleanup calls
+        self.http = requests.Session()
         self.session_id = self._create_session(dependencies, execution_options)
 
     def _create_session(
         self, dependencies: Optional[List[str]] = None, execution_options: Optional[Dict[str, Any]] = None
     ) -> str:
         """Create a new CodeBox session"""
-        response = requests.post(
+        response = self.http.post(
             f"{CODEBOX_URL}/sessions",
             json={"dependencies": dependencies or [], "execution_options": execution_options or {}},
         )
@@ -47,13 +49,15 @@ class CodeBoxSession:
     def execute_code(self, code: str) -> Dict[str, Any]:
         """Execute code in the session"""
         # Submit code execution request
-        execution_response = requests.post(f"{CODEBOX_URL}/execute", json={"code": code, "session_id": self.session_id})
+        execution_response = self.http.post(
+            f"{CODEBOX_URL}/execute", json={"code": code, "session_id": self.session_id}
+        )
         execution_response.raise_for_status()
         request_id = execution_response.json()["request_id"]
 
         # Poll for results
         while True:
-            status_response = requests.get(f"{CODEBOX_URL}/execute/{request_id}/status")
+            status_response = self.http.get(f"{CODEBOX_URL}/execute/{request_id}/status")
             status = status_response.json()
 
             if status["status"] in ["completed", "failed", "error"]:
@@ -62,12 +66,13 @@ class CodeBoxSession:
             time.sleep(1)
 
         # Get final results
-        results = requests.get(f"{CODEBOX_URL}/execute/{request_id}/results")
+        results = self.http.get(f"{CODEBOX_URL}/execute/{request_id}/results")
         return results.json()
 
     def cleanup(self):
         """Cleanup the session"""
-        requests.delete(f"{CODEBOX_URL}/sessions/{self.session_id}")
+        self.http.delete(f"{CODEBOX_URL}/sessions/{self.session_id}")
+        self.http.close()
 
 
 # Define available functions for OpenAI
@@ -85,6 +90,9 @@ functions = [
     }
 ]
 
+# Tool definitions sent with every completion request
+tools = [{"type": "function", "function": f} for f in functions]
+
 
 def chat_with_code_execution(user_message: str, messages: List[Dict], session: Optional[CodeBoxSession] = None) -> None:
     """Chat with GPT-4 with code execution capabilities"""
@@ -102,7 +110,7 @@ def chat_with_code_execution(user_message: str, messages: List[Dict], session: O
             response = client.chat.completions.create(
                 model=os.environ["AZURE_OPENAI_DEPLOYMENT"],
                 messages=messages,
-                tools=[{"type": "function", "function": f} for f in functions],
+                tools=tools,
                 tool_choice="auto",
             )
 
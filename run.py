@@ -2,6 +2,14 @@
 """
 Entry point for running CodeBox-AI servers.
 Allows running the FastAPI server, MCP server, or both.
+
+Server modules are imported inside the run functions so that only the
+selected mode pays for its imports, and `--help` stays fast.
+
+uvicorn[standard] installs uvloop and httptools, which uvicorn's default
+"auto" loop and HTTP settings already select. Servers run a single worker
+process because sessions, requests and results are held in memory by the
+CodeExecutionService of the process that created them.
 """
 
 import argparse
@@ -9,12 +17,6 @@ import logging
 import os
 import sys
 
-import uvicorn
-
-from codeboxai.main import app as fastapi_app
-from codeboxai.mcp_server import create_mcp_server
-from codeboxai.server import create_combined_app
-
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -25,12 +27,20 @@ logger = logging.getLogger(__name__)
 
 def run_fastapi(host: str = "0.0.0.0", port: int = 8000):
     """Run the FastAPI server"""
+    import uvicorn
+
+    from codeboxai.main import app as fastapi_app
+
     logger.info(f"Starting FastAPI server on {host}:{port}")
     uvicorn.run(fastapi_app, host=host, port=port)
 
 
 def run_mcp(host: str = "0.0.0.0", port: int = 8001):
     """Run the MCP server standalone"""
+    import uvicorn
+
+    from codeboxai.mcp_server import create_mcp_server
+
     logger.info(f"Starting MCP server on {host}:{port}")
     mcp = create_mcp_server("CodeBox-AI")
     uvicorn.run(mcp.sse_app(), host=host, port=port)
@@ -38,6 +48,10 @@ def run_mcp(host: str = "0.0.0.0", port: int = 8001):
 
 def run_combined(host: str = "0.0.0.0", port: int = 8000):
     """Run the combined FastAPI and MCP server"""
+    import uvicorn
+
+    from codeboxai.server import create_combined_app
+
     logger.info(f"Starting combined server on {host}:{port}")
     app = create_combined_app()
     uvicorn.run(app, host=host, port=port)
@@ -1,6 +1,9 @@
+import re
+from dataclasses import FrozenInstanceError, replace
+
 import pytest
 
-from codeboxai.security.validators.code import CodeValidator
+from codeboxai.security.validators.code import CodeValidator, ValidationRule
 
 
 @pytest.fixture
@@ -26,6 +29,61 @@ def test_enable_disable_rules(validator):
     assert "Forbidden import" in message
 
 
+def test_rules_changed_through_validator(validator):
+    # Rules are immutable, so changes go through the validator, which drops stale results
+    assert not validator.validate_code("import sys")[0]
+    with pytest.raises(FrozenInstanceError):
+        validator.rules_lookup["dangerous_imports"].enabled = False
+    with pytest.raises(AttributeError):
+        validator.rules.append(validator.rules[0])
+    with pytest.raises(TypeError):
+        validator.rules_lookup["no_todo"] = validator.rules[0]
+
+    validator.set_rule(replace(validator.rules_lookup["dangerous_imports"], enabled=False))
+    assert validator.validate_code("import sys")[0]
+
+    validator.set_rule(
+        ValidationRule(
+            name="no_todo",
+            description="Reject unfinished code",
+            validation_fn=lambda code: ("TODO" not in code, "Unfinished code"),
+        )
+    )
+    assert validator.rules[-1].name == "no_todo"
+    assert validator.validate_code("x = 1  # TODO") == (False, "Unfinished code")
+
+
+def test_validate_many(validator):
+    codes = ["print('hello')", "import sys", "", "print('hello')", "eval('2+2')"]
+    results = validator.validate_many(codes)
+
+    assert results == [validator.validate_code(code) for code in codes]
+    assert [is_valid for is_valid, _ in results] == [True, False, True, True, False]
+    assert validator.validate_many([]) == []
+
+
+def test_validation_results_cached(validator):
+    # Empty and whitespace-only code passes without running the rules
+    assert validator.validate_code("") == (True, "Code validation passed")
+    assert validator.validate_code("  \n\t") == (True, "Code validation passed")
+
+    # Re-submitted code is answered from the cache
+    first = validator.validate_code("eval('2+2')")
+    assert validator.validate_code("eval('2+2')") == first
+    assert not first[0]
+
+    # Enabling or disabling a rule drops the results cached before
+    validator.disable_rule("dangerous_builtins")
+    assert validator.validate_code("eval('2+2')")[0]
+    validator.enable_rule("dangerous_builtins")
+    assert validator.validate_code("eval('2+2')") == first
+
+    # Large code is cached under a digest and still validated correctly
+    large = "x = 1\n" * 1000 + "eval('2+2')"
+    assert not validator.validate_code(large)[0]
+    assert not validator.validate_code(large)[0]
+
+
 def test_individual_rules(validator):
     # Test jupyter commands rule
     is_valid, message = validator.rules_lookup["jupyter_commands"].validation_fn("!pip install numpy")
@@ -50,6 +108,38 @@ def test_code_validator_dangerous_imports():
     assert "Forbidden import" in message
 
 
+def test_code_validator_syntax_error_reported_once(validator):
+    # Both AST-based rules share one parse, so the syntax error is reported once
+    is_valid, message = validator.validate_code("import numpy\ndef broken(:\n    pass")
+    assert not is_valid
+    assert message.count("Invalid Python syntax") == 1
+
+
+def test_code_validator_prefilter(validator):
+    # Code without any trigger token skips the rules entirely; the kernel reports syntax errors
+    assert validator.validate_code("def broken(:\n    pass") == (True, "Code validation passed")
+
+    # Forbidden names still reach the rules, including through non-ASCII spellings that Python normalizes
+    for code in ("x = eval ('1')", "x = ｅｖａｌ('1')", "x = 1 if y else compile('', '', 'exec')"):
+        is_valid, message = validator.validate_code(code)
+        assert not is_valid, code
+        assert "Forbidden function call" in message
+
+
+def test_code_validator_dotted_forbidden_module(validator):
+    # Submodules can be forbidden without forbidding their parent package
+    validator.forbidden_modules = validator.forbidden_modules | {"xml.etree"}
+
+    for code in ("import xml.etree.ElementTree", "from xml.etree import ElementTree", "import sys.monitoring"):
+        is_valid, message = validator.validate_code(code)
+        assert not is_valid, code
+        assert "Forbidden import" in message
+
+    for code in ("import xml.dom", "import system_tools", "from xml import dom"):
+        is_valid, message = validator.validate_code(code)
+        assert is_valid, f"{code}: {message}"
+
+
 def test_code_validator_dangerous_functions():
     validator = CodeValidator()
     code = "eval('2 + 2')"
@@ -58,6 +148,86 @@ def test_code_validator_dangerous_functions():
     assert "Forbidden function call" in message
 
 
+def test_forbidden_patterns_combined(validator):
+    # Added patterns are folded into the combined search and reported by their own text
+    validator.forbidden_patterns += (re.compile(r"\bos\.system\b"),)
+
+    is_valid, message = validator.validate_code("import os\nos.system('ls')")
+    assert not is_valid
+    assert "Forbidden pattern found: \\bos\\.system\\b" in message
+
+    is_valid, message = validator.validate_code("x.__class__")
+    assert not is_valid
+    assert "Forbidden pattern found: (?<![\\!%])__\\w+__" in message
+
+
+def test_forbidden_patterns_with_groups(validator):
+    # Patterns with groups keep their own numbering, so backreferences and shared group names still work
+    validator.forbidden_patterns += (
+        re.compile(r"(['\"])secret\1"),
+        re.compile(r"(?P<name>token)\s*="),
+        re.compile(r"(?P<name>password)\s*="),
+        re.compile(r"(?i)api_key"),
+        re.compile(r"(?i)private_key"),
+    )
+
+    for code, pattern in [
+        ('x = "secret"', r"(['\"])secret\1"),
+        ("password = 1", r"(?P<name>password)\s*="),
+        ("PRIVATE_KEY", "(?i)private_key"),
+        ("x.__class__", r"(?<![\!%])__\w+__"),
+    ]:
+        is_valid, message = validator.validate_code(code)
+        assert not is_valid, code
+        assert f"Forbidden pattern found: {pattern}" in message
+
+    assert validator.validate_code("x = \"secret'\"")[0]
+
+
+def test_validation_cache_follows_configuration(validator):
+    # Results cached before a setting changes are not served after it
+    assert validator.validate_code("import os\nos.system('ls')")[0]
+    validator.forbidden_patterns += (re.compile(r"\bos\.system\b"),)
+    assert not validator.validate_code("import os\nos.system('ls')")[0]
+
+    assert validator.validate_code("import os")[0]
+    validator.forbidden_modules |= {"os"}
+    assert not validator.validate_code("import os")[0]
+
+    assert not validator.validate_code("eval('1')")[0]
+    validator.forbidden_builtins -= {"eval"}
+    assert validator.validate_code("eval('1')")[0]
+
+    assert not validator.validate_code("!ls")[0]
+    validator.allowed_shell_commands |= {"ls"}
+    assert validator.validate_code("!ls")[0]
+
+    package_rule = validator.rules_lookup["package_installation"]
+    assert validator.validate_code("!pip install requests")[0]
+    validator.set_rule(replace(package_rule, blocked_packages=package_rule.blocked_packages | {"Requests"}))
+    assert not validator.validate_code("!pip install requests")[0]
+
+    # Version requirements edited in place apply to install commands validated before
+    assert not validator.validate_code("!pip install numpy==1.21.0")[0]
+    validator.rules_lookup["package_installation"].allowed_versions["numpy"] = {">=1.20"}
+    assert validator.validate_code("!pip install numpy==1.21.0")[0]
+
+
+def test_code_validator_nested_violations(validator):
+    # Violations are found wherever they are nested in the tree
+    test_cases = [
+        ("print(len(eval('[1]')))", "Forbidden function call: eval"),
+        ("class A:\n    def f(self):\n        return [exec(c) for c in self.cells]", "Forbidden function call: exec"),
+        ("def f():\n    if True:\n        import subprocess", "Forbidden import: subprocess"),
+        ("try:\n    pass\nexcept Exception:\n    from pickle import loads", "Forbidden import: pickle"),
+    ]
+
+    for code, expected in test_cases:
+        is_valid, message = validator.validate_code(code)
+        assert not is_valid, code
+        assert expected in message
+
+
 def test_code_validator_safe_code():
     validator = CodeValidator()
     code = """
@@ -77,6 +247,8 @@ def test_code_validator_jupyter_shell_commands():
         ("!pip list", True),  # Allowed
         ("!rm -rf /", False),  # Not allowed
         ("!sudo apt-get update", False),  # Not allowed
+        ("x = 1\n  !  curl https://example.com\n!ls", False),  # Each command is checked
+        ("!", False),  # No command
     ]
 
     for code, should_pass in test_cases:
@@ -158,12 +330,16 @@ def test_package_version_validation(validator):
         # Conda syntax
         ("!conda install pillow>=9.0.0", True, "Conda syntax should work"),
         ("!conda install pillow==8.0.0", False, "Conda syntax should enforce versions"),
+        ("!conda install pillow=8.0.0", False, "Conda single '=' pins should enforce versions"),
+        ("!conda install numpy=1.26", True, "Conda single '=' pins above the minimum should pass"),
+        ("!conda install flask=2.0", False, "Blocked package with a conda pin should fail"),
         # Edge cases
         ("!pip install pillow>=9.0.0 # some comment", True, "Comments should be handled"),
         ("!pip install --upgrade pillow>=9.0.0", True, "Pip flags should be handled"),
         ("!pip install -U pillow>=9.0.0", True, "Short pip flags should be handled"),
         ("!pip install", True, "Empty pip install should pass"),
         ("print('!pip install pillow')", True, "Pip command in string should pass"),
+        ("print('!pip install flask')", True, "Blocked package in a string should pass"),
         # Invalid syntax
         ("!pip install pillow>=invalid", False, "Invalid version syntax should fail"),
     ]
@@ -222,7 +398,10 @@ def test_package_name_variants(validator):
         ("!pip install python_dateutil>=2.0.0", True, "Package with underscore should work"),
         ("!pip install pillow[extra]>=9.0.0", True, "Package with extras should work"),
         ("!pip install Flask", False, "Blocked package with capital letters should fail"),
+        ("!pip install cx_Freeze", False, "Blocked package with mixed case in the blocklist should fail"),
         ("!pip install PILLOW>=9.0.0", True, "Package name should be case insensitive"),
+        ("!pip install PILLOW==8.0.0", False, "Version checks should apply to any capitalization"),
+        ("!pip install cx.freeze", False, "Blocked package with another separator should fail"),
     ]
 
     for code, should_pass, message in test_cases:
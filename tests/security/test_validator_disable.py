@@ -1,4 +1,11 @@
-from codeboxai.security.validators.code import create_validator_with_disabled_rules
+from dataclasses import FrozenInstanceError
+
+import pytest
+
+from codeboxai.security.validators.code import (
+    create_validator_with_disabled_rules,
+    get_default_validator,
+)
 
 
 def test_create_validator_with_disabled_rules():
@@ -31,6 +38,72 @@ eval('2+2')
     assert is_valid
     assert "passed" in message
 
+    # Nothing is parsed or cached when no rule is enabled
+    assert validator.validate_code("def broken(:") == (True, "Code validation passed")
+    assert not validator._results_cache
+
+
+def test_default_validator_is_shared():
+    # Without disabled rules the factory hands out the shared default validator
+    assert create_validator_with_disabled_rules() is get_default_validator()
+    assert create_validator_with_disabled_rules([]) is get_default_validator()
+
+    # Disabling rules builds a separate validator and leaves the default untouched
+    validator = create_validator_with_disabled_rules(["dangerous_imports"])
+    assert validator is not get_default_validator()
+    assert get_default_validator().rules_lookup["dangerous_imports"].enabled
+
+    is_valid, message = get_default_validator().validate_code("import sys")
+    assert not is_valid
+    assert "Forbidden import" in message
+
+
+def test_validators_cached_by_disabled_rules():
+    # The same set of disabled rules gets the same validator, whatever the order
+    validator = create_validator_with_disabled_rules(["dangerous_imports", "dangerous_builtins"])
+    assert create_validator_with_disabled_rules(["dangerous_builtins", "dangerous_imports"]) is validator
+    assert create_validator_with_disabled_rules(["dangerous_imports"]) is not validator
+
+    # Unknown rule names are ignored rather than creating new validators
+    assert create_validator_with_disabled_rules(["no_such_rule"]) is get_default_validator()
+    assert create_validator_with_disabled_rules(["dangerous_imports", "no_such_rule"]) is (
+        create_validator_with_disabled_rules(["dangerous_imports"])
+    )
+
+    is_valid, _ = create_validator_with_disabled_rules(["all"]).validate_code("import sys\neval('2+2')")
+    assert is_valid
+
+
+def test_shared_validators_cannot_be_reconfigured():
+    # Validators handed out to several callers reject changes instead of leaking them to the others
+    for validator in (get_default_validator(), create_validator_with_disabled_rules(["dangerous_imports"])):
+        with pytest.raises(RuntimeError, match="Shared validators cannot be reconfigured"):
+            validator.enable_rule("dangerous_imports")
+        with pytest.raises(RuntimeError, match="Shared validators cannot be reconfigured"):
+            validator.disable_rule("dangerous_builtins")
+        with pytest.raises(RuntimeError, match="Shared validators cannot be reconfigured"):
+            validator.forbidden_modules |= {"os"}
+        with pytest.raises(RuntimeError, match="Shared validators cannot be reconfigured"):
+            validator.set_rule(validator.rules[0])
+
+        # The rules themselves cannot be changed either
+        package_rule = validator.rules_lookup["package_installation"]
+        with pytest.raises(FrozenInstanceError):
+            validator.rules_lookup["dangerous_builtins"].enabled = False
+        with pytest.raises(FrozenInstanceError):
+            package_rule.blocked_packages = frozenset()
+        with pytest.raises(TypeError):
+            package_rule.allowed_versions["numpy"] = {">=0"}
+        with pytest.raises(AttributeError):
+            package_rule.allowed_versions["numpy"].add(">=0")
+        with pytest.raises(AttributeError):
+            validator.rules.append(validator.rules[0])
+
+    assert not get_default_validator().validate_code("import sys")[0]
+    assert not get_default_validator().validate_code("!pip install flask")[0]
+    assert not get_default_validator().validate_code("!pip install numpy==1.0.0")[0]
+    assert create_validator_with_disabled_rules(["dangerous_imports"]).validate_code("import sys")[0]
+
 
 def test_execution_request_with_disabled_validation(monkeypatch):
     from codeboxai.models import ExecutionRequest
@@ -1,8 +1,9 @@
 """Tests for the KernelManager class."""
 
+import json
+import socket
 import uuid
-from pathlib import Path
-from unittest.mock import MagicMock, mock_open, patch
+from unittest.mock import Mock, mock_open, patch
 
 import docker
 import pytest
@@ -10,95 +11,133 @@ import pytest
 from codeboxai.kernel_manager import KernelManager
 from codeboxai.models import MountPoint
 
+# IOPub messages for a kernel that prints "Hello, world!"
+_BUSY_MSG = {"header": {"msg_type": "status"}, "content": {"execution_state": "busy"}}
+_STREAM_MSG = {"header": {"msg_type": "stream"}, "content": {"name": "stdout", "text": "Hello, world!"}}
+_IDLE_MSG = {"header": {"msg_type": "status"}, "content": {"execution_state": "idle"}}
+_DEFAULT_EXEC_MSGS = (_BUSY_MSG, _STREAM_MSG, _IDLE_MSG)
+
+# Rich outputs for the output type tests
+_EXECUTE_RESULT_MSG = {
+    "header": {"msg_type": "execute_result"},
+    "content": {"data": {"text/plain": "42", "text/html": "<b>42</b>", "image/png": "base64_image_data"}},
+}
+_DISPLAY_DATA_MSG = {"header": {"msg_type": "display_data"}, "content": {"data": {"image/svg+xml": "<svg>...</svg>"}}}
+
+# Command every kernel container is started with
+_EXPECTED_START_KERNEL_CMD = ["python", "-m", "ipykernel_launcher", "-f", "/opt/connection/kernel.json"]
+
+
+def _configure_docker_client(mock_client):
+    """Configure a mocked Docker client with the kernel image available and a running container."""
+    mock_image = Mock(tags=["codeboxai-jupyter-base:latest"])
+    mock_container = Mock(status="running", **{"logs.return_value": b"Container started successfully"})
+    mock_client.configure_mock(
+        **{
+            "api.version.return_value": "1.41",
+            "images.list.return_value": [mock_image],
+            "images.get.return_value": mock_image,
+            "containers.run.return_value": mock_container,
+        }
+    )
+    return mock_client
+
 
 @pytest.fixture
 def mock_docker_client():
     """Mock Docker client fixture."""
-    mock_client = MagicMock()
-    # Mock API version
-    mock_client.api.version.return_value = "1.41"
-
-    # Setup images mock
-    mock_image = MagicMock()
-    mock_image.tags = ["codeboxai-jupyter-base:latest"]
-    mock_client.images.list.return_value = [mock_image]
-    mock_client.images.get.return_value = mock_image
-
-    # Setup container mock
-    mock_container = MagicMock()
-    mock_container.status = "running"
-    mock_container.logs.return_value = b"Container started successfully"
-    mock_client.containers.run.return_value = mock_container
-
-    return mock_client
+    return _configure_docker_client(Mock())
 
 
 @pytest.fixture
 def mock_jupyter_client():
     """Mock Jupyter client fixture."""
-    mock_client = MagicMock()
+    mock_client = Mock()
     mock_client.start_channels.return_value = None
     mock_client.wait_for_ready.return_value = True
 
-    # Setup message responses for code execution
-    def mock_get_iopub_msg(timeout=None):
-        # First return a status message with 'busy' state
-        # Then return a stream output
-        # Finally return a status message with 'idle' state
-        if not hasattr(mock_get_iopub_msg, "call_count"):
-            mock_get_iopub_msg.call_count = 0
+    # Kernel goes busy, prints to stdout, then goes back to idle
+    mock_client.get_iopub_msg.side_effect = _DEFAULT_EXEC_MSGS
+    return mock_client
 
-        mock_get_iopub_msg.call_count += 1
 
-        if mock_get_iopub_msg.call_count == 1:
-            return {"header": {"msg_type": "status"}, "content": {"execution_state": "busy"}}
-        elif mock_get_iopub_msg.call_count == 2:
-            return {"header": {"msg_type": "stream"}, "content": {"name": "stdout", "text": "Hello, world!"}}
-        else:
-            return {"header": {"msg_type": "status"}, "content": {"execution_state": "idle"}}
+@pytest.fixture
+def make_kernel_entry():
+    """Factory for mocked KernelManager.kernels entries."""
 
-    mock_client.get_iopub_msg.side_effect = mock_get_iopub_msg
-    return mock_client
+    def _make(client=None):
+        return {
+            "client": client or Mock(),
+            "container": Mock(),
+            "connection_file": Mock(),
+            "client_file": Mock(),
+        }
+
+    return _make
+
+
+@pytest.fixture(scope="session")
+def connection_info():
+    """Kernel connection info with fixed ports and key; tests must not modify it."""
+    return {
+        "shell_port": 1000,
+        "iopub_port": 1001,
+        "stdin_port": 1002,
+        "control_port": 1003,
+        "hb_port": 1004,
+        "ip": "0.0.0.0",
+        "transport": "tcp",
+        "signature_scheme": "hmac-sha256",
+        "key": "test-key",
+    }
+
+
+@pytest.fixture(scope="module")
+def connection_dir(tmp_path_factory):
+    """Connection directory of the shared KernelManager."""
+    return tmp_path_factory.mktemp("kernel_connections")
 
 
 @pytest.fixture
-def kernel_manager():
-    """Create a KernelManager instance with mocked dependencies."""
-    with patch("docker.from_env") as mock_docker_from_env:
-        mock_client = MagicMock()
-        mock_client.api.version.return_value = "1.41"
-        mock_image = MagicMock()
-        mock_image.tags = ["codeboxai-jupyter-base:latest"]
-        mock_client.images.list.return_value = [mock_image]
-        mock_client.images.get.return_value = mock_image
-        mock_container = MagicMock()
-        mock_container.status = "running"
-        mock_container.logs.return_value = b"Container started successfully"
-        mock_client.containers.run.return_value = mock_container
-        mock_docker_from_env.return_value = mock_client
-
-        with patch("tempfile.mkdtemp") as mock_mkdtemp:
-            mock_mkdtemp.return_value = "/tmp/kernel_connections"
-            manager = KernelManager()
-            yield manager
+def mock_connection_tuple(connection_info, connection_dir):
+    """Return value for a mocked _create_connection_file."""
+    return connection_info, connection_dir / "kernel-test-kernel.json"
 
 
-def test_init():
-    """Test KernelManager initialization."""
+@pytest.fixture(scope="module")
+def shared_kernel_manager(connection_dir):
+    """Create a KernelManager instance with mocked dependencies, once for the module."""
     with patch("docker.from_env") as mock_docker_from_env:
-        mock_client = MagicMock()
-        mock_docker_from_env.return_value = mock_client
+        mock_docker_from_env.return_value = _configure_docker_client(Mock())
+
+        with patch("tempfile.mkdtemp", return_value=str(connection_dir)):
+            return KernelManager()
+
 
-        with patch("tempfile.mkdtemp", return_value="/tmp/kernel_connections"):
+@pytest.fixture
+def kernel_manager(request, shared_kernel_manager, connection_dir):
+    """Reset the shared KernelManager for each test; parametrize indirectly to use another image name."""
+    shared_kernel_manager.image_name = getattr(request, "param", "codeboxai-jupyter-base:latest")
+    shared_kernel_manager.docker_client.reset_mock(return_value=True, side_effect=True)
+    _configure_docker_client(shared_kernel_manager.docker_client)
+    shared_kernel_manager.kernels = {}
+    shared_kernel_manager.connection_dir = connection_dir
+    return shared_kernel_manager
+
+
+def test_init(mock_docker_client, tmp_path):
+    """Test KernelManager initialization."""
+    with patch("docker.from_env", return_value=mock_docker_client):
+        with patch("tempfile.mkdtemp", return_value=str(tmp_path)):
             manager = KernelManager()
 
-            assert manager.docker_client == mock_client
+            assert manager.docker_client == mock_docker_client
             assert manager.image_name == "codeboxai-jupyter-base:latest"
             assert isinstance(manager.kernels, dict)
-            assert manager.connection_dir == Path("/tmp/kernel_connections")
+            assert manager.connection_dir == tmp_path
 
             # Verify _ensure_kernel_image was called during init
-            mock_client.images.get.assert_called_once_with(manager.image_name)
+            mock_docker_client.images.get.assert_called_once_with(manager.image_name)
 
 
 def test_init_docker_error():
@@ -140,283 +179,211 @@ def test_ensure_kernel_image_build(kernel_manager):
     assert "path" in kwargs
 
 
-def test_find_free_port():
-    """Test _find_free_port method."""
-    # Create a separate version of the test that doesn't rely on fixture
-    with patch("docker.from_env"):
-        # Create a mock socket that only responds to the getsockname() method
-        with patch("socket.socket") as mock_socket_constructor:
-            mock_socket = MagicMock()
-            mock_socket.getsockname.return_value = ("127.0.0.1", 12345)
-            mock_socket_constructor.return_value.__enter__.return_value = mock_socket
+class _SocketStub:
+    """Stand-in for socket.socket that records the calls made by _find_free_port."""
 
-            # Create KernelManager with minimal dependencies
-            with patch("tempfile.mkdtemp", return_value="/tmp/kernel_connections"):
-                manager = KernelManager()
+    def __init__(self, *args):
+        self.args = args
+        self.bound_address = None
+        self.backlog = None
 
-                # Test the _find_free_port directly
-                port = manager._find_free_port()
+    def __enter__(self):
+        return self
 
-                # Assertions
-                assert port == 12345
-                mock_socket.bind.assert_called_once_with(("", 0))
-                mock_socket.listen.assert_called_once_with(1)
-                mock_socket.getsockname.assert_called_once()
+    def __exit__(self, *exc_info):
+        return False
 
+    def bind(self, address):
+        self.bound_address = address
 
-def test_create_connection_file():
-    """Test _create_connection_file method."""
-    kernel_id = "test-kernel"
-    with patch("docker.from_env") as mock_docker:
-        mock_docker.return_value = MagicMock()
-        with patch("tempfile.mkdtemp", return_value="/tmp/kernel_connections"):
-            with patch("socket.socket"):
-                manager = KernelManager()
-                manager.connection_dir = Path("/tmp/kernel_connections")
-                with patch.object(manager, "_find_free_port", side_effect=[1000, 1001, 1002, 1003, 1004]):
-                    m = mock_open()
-                    with patch("builtins.open", m):
-                        with patch("uuid.uuid4", return_value=uuid.UUID("12345678-1234-5678-1234-567812345678")):
-                            with patch("json.dump") as mock_json_dump:
-                                connection_info, connection_file = manager._create_connection_file(kernel_id)
-    assert connection_info["shell_port"] == 1000
-    assert connection_info["iopub_port"] == 1001
-    assert connection_info["stdin_port"] == 1002
-    assert connection_info["control_port"] == 1003
-    assert connection_info["hb_port"] == 1004
-    assert connection_info["ip"] == "0.0.0.0"
-    assert connection_info["transport"] == "tcp"
-    assert connection_info["signature_scheme"] == "hmac-sha256"
-    assert connection_info["key"] == "12345678-1234-5678-1234-567812345678"
-    expected_path = Path("/tmp/kernel_connections") / f"kernel-{kernel_id}.json"
-    assert connection_file == expected_path
-    m.assert_called_once_with(expected_path, "w")
-    # Check that json.dump was called with the correct data
-    mock_json_dump.assert_called_once_with(connection_info, m())
-
-
-def test_start_kernel(kernel_manager):
-    """Test start_kernel method."""
-    kernel_id = "test-kernel"
+    def listen(self, backlog):
+        self.backlog = backlog
 
-    # Mock necessary methods and dependencies
-    with patch.object(kernel_manager, "_create_connection_file") as mock_create_file:
-        mock_create_file.return_value = (
-            {
-                "shell_port": 1000,
-                "iopub_port": 1001,
-                "stdin_port": 1002,
-                "control_port": 1003,
-                "hb_port": 1004,
-                "ip": "0.0.0.0",
-                "transport": "tcp",
-                "signature_scheme": "hmac-sha256",
-                "key": "test-key",
-            },
-            Path("/tmp/kernel_connections/kernel-test-kernel.json"),
-        )
+    def getsockname(self):
+        return ("127.0.0.1", 12345)
 
-        # Mock open function
-        m = mock_open()
-        with patch("builtins.open", m):
-            # Mock BlockingKernelClient
-            mock_client = MagicMock()
-            with patch("jupyter_client.BlockingKernelClient", return_value=mock_client):
-                kernel_manager.start_kernel(kernel_id)
 
-    # Verify Docker container was started with correct parameters
-    kernel_manager.docker_client.containers.run.assert_called_once()
-    args, kwargs = kernel_manager.docker_client.containers.run.call_args
+def test_find_free_port(monkeypatch, kernel_manager):
+    """Test _find_free_port method."""
+    sockets = []
 
-    # Check important container configurations
-    assert kwargs["image"] == kernel_manager.image_name
-    assert kwargs["command"] == ["python", "-m", "ipykernel_launcher", "-f", "/opt/connection/kernel.json"]
-    assert "/tmp/kernel_connections/kernel-test-kernel.json" in kwargs["volumes"]
+    def make_socket(*args):
+        sockets.append(_SocketStub(*args))
+        return sockets[-1]
 
-    # Verify client was properly set up
-    assert kernel_id in kernel_manager.kernels
-    assert mock_client.start_channels.called
-    assert mock_client.wait_for_ready.called
+    monkeypatch.setattr("socket.socket", make_socket)
 
+    # Test the _find_free_port directly
+    port = kernel_manager._find_free_port()
 
-def test_start_kernel_with_mount_points():
-    """Test start_kernel method with custom mount points."""
-    with patch("docker.from_env") as mock_docker_from_env:
-        mock_client = MagicMock()
-        mock_container = MagicMock()
-        mock_container.status = "running"
-        mock_client.containers.run.return_value = mock_container
-        mock_docker_from_env.return_value = mock_client
-        with patch("tempfile.mkdtemp", return_value="/tmp/kernel_connections"):
-            with patch("socket.socket"):
-                with patch("pathlib.Path.exists", return_value=True):
-                    manager = KernelManager(image_name="test-image")
-                    manager.connection_dir = Path("/tmp/kernel_connections")
-                    kernel_id = "test-kernel"
-                    mount_points = [
-                        MountPoint(host_path="/host/path1", container_path="/container/path1", read_only=True),
-                        MountPoint(host_path="/host/path2", container_path="/container/path2", read_only=False),
-                    ]
-                    connection_info = {
-                        "shell_port": 1000,
-                        "iopub_port": 1001,
-                        "stdin_port": 1002,
-                        "control_port": 1003,
-                        "hb_port": 1004,
-                        "ip": "0.0.0.0",
-                        "transport": "tcp",
-                        "signature_scheme": "hmac-sha256",
-                        "key": "test-key",
-                    }
-                    connection_file = Path("/tmp/kernel_connections/kernel-test-kernel.json")
-                    with patch.object(
-                        manager, "_create_connection_file", return_value=(connection_info, connection_file)
-                    ):
-                        with patch("builtins.open", mock_open()):
-                            with patch("json.dump") as mock_json_dump:
-                                mock_jupyter_client = MagicMock()
-                                with patch("jupyter_client.BlockingKernelClient", return_value=mock_jupyter_client):
-                                    manager.start_kernel(kernel_id, mount_points)
-    mock_client.containers.run.assert_called_once()
-    args, kwargs = mock_client.containers.run.call_args
-    assert kwargs["image"] == "test-image"
-    assert kwargs["command"] == ["python", "-m", "ipykernel_launcher", "-f", "/opt/connection/kernel.json"]
-    volumes = kwargs["volumes"]
-    assert len(volumes) == 3
-    assert str(connection_file) in volumes
-    assert "/host/path1" in volumes
-    assert "/host/path2" in volumes
-    assert volumes["/host/path1"]["mode"] == "ro"
-    assert volumes["/host/path2"]["mode"] == "rw"
-    assert volumes["/host/path1"]["bind"] == "/container/path1"
-    assert volumes["/host/path2"]["bind"] == "/container/path2"
-    # json.dump should be called for both connection and client files
-    assert mock_json_dump.call_count >= 1
-
-
-def test_start_kernel_container_fail(kernel_manager):
-    """Test start_kernel when container fails to start."""
+    # Assertions
+    assert port == 12345
+    [sock] = sockets
+    assert sock.args == (socket.AF_INET, socket.SOCK_STREAM)
+    assert sock.bound_address == ("", 0)
+    assert sock.backlog == 1
+
+
+def test_create_connection_file(monkeypatch, tmp_path, mock_docker_client, connection_info):
+    """Test _create_connection_file method."""
     kernel_id = "test-kernel"
+    monkeypatch.setattr("docker.from_env", lambda: mock_docker_client)
+    monkeypatch.setattr("tempfile.mkdtemp", lambda prefix=None: str(tmp_path))
+    monkeypatch.setattr("uuid.uuid4", lambda: uuid.UUID("12345678-1234-5678-1234-567812345678"))
 
-    # Configure mock container to report failed status
-    mock_container = MagicMock()
-    mock_container.status = "exited"
-    mock_container.logs.return_value = b"Container failed to start"
-    kernel_manager.docker_client.containers.run.return_value = mock_container
+    manager = KernelManager()
+    ports = iter(range(1000, 1005))
+    monkeypatch.setattr(manager, "_find_free_port", lambda: next(ports))
 
-    # Mock necessary methods and dependencies
-    with patch.object(kernel_manager, "_create_connection_file") as mock_create_file:
-        mock_create_file.return_value = (
-            {
-                "shell_port": 1000,
-                "iopub_port": 1001,
-                "stdin_port": 1002,
-                "control_port": 1003,
-                "hb_port": 1004,
-                "ip": "0.0.0.0",
-                "transport": "tcp",
-                "signature_scheme": "hmac-sha256",
-                "key": "test-key",
-            },
-            Path("/tmp/kernel_connections/kernel-test-kernel.json"),
-        )
+    created_info, connection_file = manager._create_connection_file(kernel_id)
+    assert created_info == {**connection_info, "key": "12345678-1234-5678-1234-567812345678"}
+    assert connection_file == tmp_path / f"kernel-{kernel_id}.json"
+    # Check that the connection info was written to the file
+    assert json.loads(connection_file.read_text()) == created_info
 
-        # Mock open function
-        m = mock_open()
-        with patch("builtins.open", m):
-            # Mock BlockingKernelClient
-            mock_client = MagicMock()
-            with patch("jupyter_client.BlockingKernelClient", return_value=mock_client):
-                with pytest.raises(RuntimeError) as exc_info:
-                    kernel_manager.start_kernel(kernel_id)
 
-                assert "Kernel container failed to start" in str(exc_info.value)
+def _assert_volumes(volumes, connection_file, expected_bindings):
+    """Check that a kernel container mounts its connection file read-only plus exactly the expected bindings."""
+    assert volumes == {str(connection_file): {"bind": "/opt/connection/kernel.json", "mode": "ro"}, **expected_bindings}
 
-                # Verify container was removed
-                mock_container.remove.assert_called_once()
 
+@pytest.mark.parametrize(
+    "kernel_manager,mounts,expected_mount_volumes,container_status,expect_error",
+    [
+        ("codeboxai-jupyter-base:latest", None, {}, "running", False),
+        (
+            "test-image",
+            [("/host/path1", "/container/path1", True), ("/host/path2", "/container/path2", False)],
+            {
+                "/host/path1": {"bind": "/container/path1", "mode": "ro"},
+                "/host/path2": {"bind": "/container/path2", "mode": "rw"},
+            },
+            "running",
+            False,
+        ),
+        ("codeboxai-jupyter-base:latest", None, {}, "exited", True),
+    ],
+    ids=["default", "mount_points", "container_fail"],
+    indirect=["kernel_manager"],
+)
+def test_start_kernel(
+    monkeypatch,
+    kernel_manager,
+    mock_connection_tuple,
+    mounts,
+    expected_mount_volumes,
+    container_status,
+    expect_error,
+):
+    """Test start_kernel method, with mount points and when the container fails to start."""
+    kernel_id = "test-kernel"
+    if mounts is None:
+        # Leave mount_points out so its default is exercised
+        start_args = (kernel_id,)
+    else:
+        # Mount points require existing host paths
+        monkeypatch.setattr("pathlib.Path.exists", lambda self, **kwargs: True)
+        mount_points = [MountPoint(host_path=host, container_path=path, read_only=ro) for host, path, ro in mounts]
+        start_args = (kernel_id, mount_points)
+    mock_container = kernel_manager.docker_client.containers.run.return_value
+    mock_container.status = container_status
+
+    # Mock necessary methods and dependencies
+    mock_client = Mock()
+    monkeypatch.setattr(kernel_manager, "_create_connection_file", lambda kernel_id: mock_connection_tuple)
+    monkeypatch.setattr("jupyter_client.BlockingKernelClient", lambda: mock_client)
+    # Don't wait between status checks of a container that never starts
+    monkeypatch.setattr("codeboxai.kernel_manager.time.sleep", lambda seconds: None)
+
+    # The client connection file is written through the module's own open and json names only
+    mock_file_open = mock_open()
+    monkeypatch.setattr("codeboxai.kernel_manager.open", mock_file_open, raising=False)
+    mock_json = Mock()
+    monkeypatch.setattr("codeboxai.kernel_manager.json", mock_json)
+
+    if expect_error:
+        with pytest.raises(RuntimeError, match="Kernel container failed to start"):
+            kernel_manager.start_kernel(*start_args)
+    else:
+        kernel_manager.start_kernel(*start_args)
 
-def test_stop_kernel(kernel_manager):
+    # Verify Docker container was started with correct parameters
+    kernel_manager.docker_client.containers.run.assert_called_once()
+    args, kwargs = kernel_manager.docker_client.containers.run.call_args
+
+    # Check important container configurations
+    assert kwargs["image"] == kernel_manager.image_name
+    assert kwargs["command"] == _EXPECTED_START_KERNEL_CMD
+    _assert_volumes(kwargs["volumes"], mock_connection_tuple[1], expected_mount_volumes)
+
+    if expect_error:
+        # Verify container was removed
+        mock_container.remove.assert_called_once()
+        assert kernel_id not in kernel_manager.kernels
+        mock_file_open.assert_not_called()
+    else:
+        # Verify client was properly set up
+        assert kernel_id in kernel_manager.kernels
+        mock_file_open.assert_called_once_with(kernel_manager.connection_dir / f"client-{kernel_id}.json", "w")
+        mock_json.dump.assert_called_once()
+        assert mock_json.dump.call_args.args[1] is mock_file_open.return_value
+        assert mock_client.start_channels.called
+        assert mock_client.wait_for_ready.called
+
+
+def test_stop_kernel(kernel_manager, make_kernel_entry):
     """Test stop_kernel method."""
     kernel_id = "test-kernel"
 
     # Set up a mock kernel
-    mock_client = MagicMock()
-    mock_container = MagicMock()
-    mock_connection_file = MagicMock()
-    mock_client_file = MagicMock()
-
-    kernel_manager.kernels[kernel_id] = {
-        "client": mock_client,
-        "container": mock_container,
-        "connection_file": mock_connection_file,
-        "client_file": mock_client_file,
-    }
+    kernel = kernel_manager.kernels[kernel_id] = make_kernel_entry()
 
     # Call stop_kernel
     kernel_manager.stop_kernel(kernel_id)
 
     # Verify all cleanup operations were called
-    mock_client.stop_channels.assert_called_once()
-    mock_container.stop.assert_called_once_with(timeout=5)
-    mock_container.remove.assert_called_once()
-    mock_connection_file.unlink.assert_called_once()
-    mock_client_file.unlink.assert_called_once()
+    kernel["client"].stop_channels.assert_called_once()
+    kernel["container"].stop.assert_called_once_with(timeout=5)
+    kernel["container"].remove.assert_called_once()
+    kernel["connection_file"].unlink.assert_called_once()
+    kernel["client_file"].unlink.assert_called_once()
 
     # Verify kernel was removed from kernels dictionary
     assert kernel_id not in kernel_manager.kernels
 
 
-def test_stop_kernel_error_handling(kernel_manager):
+def test_stop_kernel_error_handling(kernel_manager, make_kernel_entry):
     """Test stop_kernel error handling."""
     kernel_id = "test-kernel"
 
     # Set up a mock kernel with components that raise exceptions
-    mock_client = MagicMock()
-    mock_client.stop_channels.side_effect = Exception("Client error")
-
-    mock_container = MagicMock()
-    mock_container.stop.side_effect = Exception("Container stop error")
-    mock_container.remove.side_effect = Exception("Container remove error")
-
-    mock_connection_file = MagicMock()
-    mock_connection_file.unlink.side_effect = Exception("Connection file error")
-
-    mock_client_file = MagicMock()
-    mock_client_file.unlink.side_effect = Exception("Client file error")
-
-    kernel_manager.kernels[kernel_id] = {
-        "client": mock_client,
-        "container": mock_container,
-        "connection_file": mock_connection_file,
-        "client_file": mock_client_file,
-    }
+    kernel = kernel_manager.kernels[kernel_id] = make_kernel_entry()
+    kernel["client"].stop_channels.side_effect = Exception("Client error")
+    kernel["container"].stop.side_effect = Exception("Container stop error")
+    kernel["container"].remove.side_effect = Exception("Container remove error")
+    kernel["connection_file"].unlink.side_effect = Exception("Connection file error")
+    kernel["client_file"].unlink.side_effect = Exception("Client file error")
 
     # The method should not raise exceptions even if components fail
     kernel_manager.stop_kernel(kernel_id)
 
     # Verify all cleanup operations were called
-    mock_client.stop_channels.assert_called_once()
-    mock_container.stop.assert_called_once_with(timeout=5)
-    mock_container.remove.assert_called_once()
-    mock_connection_file.unlink.assert_called_once()
-    mock_client_file.unlink.assert_called_once()
+    kernel["client"].stop_channels.assert_called_once()
+    kernel["container"].stop.assert_called_once_with(timeout=5)
+    kernel["container"].remove.assert_called_once()
+    kernel["connection_file"].unlink.assert_called_once()
+    kernel["client_file"].unlink.assert_called_once()
 
     # Verify kernel was removed from kernels dictionary despite errors
     assert kernel_id not in kernel_manager.kernels
 
 
-def test_execute_code(kernel_manager, mock_jupyter_client):
+def test_execute_code(kernel_manager, mock_jupyter_client, make_kernel_entry):
     """Test execute_code method."""
     kernel_id = "test-kernel"
 
     # Set up a mock kernel
-    kernel_manager.kernels[kernel_id] = {
-        "client": mock_jupyter_client,
-        "container": MagicMock(),
-        "connection_file": MagicMock(),
-        "client_file": MagicMock(),
-    }
+    kernel_manager.kernels[kernel_id] = make_kernel_entry(client=mock_jupyter_client)
 
     # Execute code
     result = kernel_manager.execute_code(kernel_id, "print('Hello, world!')")
@@ -439,21 +406,16 @@ def test_execute_code_kernel_not_found(kernel_manager):
     assert "Kernel nonexistent-kernel not found" in str(exc_info.value)
 
 
-def test_execute_code_error(kernel_manager, mock_jupyter_client):
+def test_execute_code_error(kernel_manager, mock_jupyter_client, make_kernel_entry):
     """Test execute_code when an error occurs."""
     kernel_id = "test-kernel"
 
     # Set up a mock kernel
-    kernel_manager.kernels[kernel_id] = {
-        "client": mock_jupyter_client,
-        "container": MagicMock(),
-        "connection_file": MagicMock(),
-        "client_file": MagicMock(),
-    }
+    kernel_manager.kernels[kernel_id] = make_kernel_entry(client=mock_jupyter_client)
 
     # Configure mock to return error message
-    def mock_get_iopub_msg(timeout=None):
-        return {
+    mock_jupyter_client.get_iopub_msg.side_effect = [
+        {
             "header": {"msg_type": "error"},
             "content": {
                 "ename": "NameError",
@@ -461,8 +423,7 @@ def test_execute_code_error(kernel_manager, mock_jupyter_client):
                 "traceback": ["Traceback...", "NameError: name 'x' is not defined"],
             },
         }
-
-    mock_jupyter_client.get_iopub_msg.side_effect = mock_get_iopub_msg
+    ]
 
     # Execute code
     result = kernel_manager.execute_code(kernel_id, "print(x)")
@@ -475,17 +436,12 @@ def test_execute_code_error(kernel_manager, mock_jupyter_client):
     assert len(result["error"]["traceback"]) == 2
 
 
-def test_execute_code_timeout(kernel_manager, mock_jupyter_client):
+def test_execute_code_timeout(kernel_manager, mock_jupyter_client, make_kernel_entry):
     """Test execute_code with timeout."""
     kernel_id = "test-kernel"
 
     # Set up a mock kernel
-    kernel_manager.kernels[kernel_id] = {
-        "client": mock_jupyter_client,
-        "container": MagicMock(),
-        "connection_file": MagicMock(),
-        "client_file": MagicMock(),
-    }
+    kernel_manager.kernels[kernel_id] = make_kernel_entry(client=mock_jupyter_client)
 
     # Configure mock to raise timeout exception
     mock_jupyter_client.get_iopub_msg.side_effect = TimeoutError("Execution timed out")
@@ -498,37 +454,22 @@ def test_execute_code_timeout(kernel_manager, mock_jupyter_client):
     assert "Execution error: Execution timed out" in result["error"]
 
 
-def test_cleanup(kernel_manager):
+def test_cleanup(kernel_manager, make_kernel_entry):
     """Test cleanup method."""
     # Add some mock kernels
-    kernel_manager.kernels = {
-        "kernel1": {
-            "client": MagicMock(),
-            "container": MagicMock(),
-            "connection_file": MagicMock(),
-            "client_file": MagicMock(),
-        },
-        "kernel2": {
-            "client": MagicMock(),
-            "container": MagicMock(),
-            "connection_file": MagicMock(),
-            "client_file": MagicMock(),
-        },
-    }
+    kernel_manager.kernels = {"kernel1": make_kernel_entry(), "kernel2": make_kernel_entry()}
 
     # Mock stop_kernel to track calls
     with patch.object(kernel_manager, "stop_kernel") as mock_stop:
         # Mock rmdir
-        mock_connection_dir = MagicMock()
+        mock_connection_dir = Mock()
         kernel_manager.connection_dir = mock_connection_dir
 
         # Call cleanup
         kernel_manager.cleanup()
 
         # Verify all kernels were stopped
-        assert mock_stop.call_count == 2
-        mock_stop.assert_any_call("kernel1")
-        mock_stop.assert_any_call("kernel2")
+        assert sorted(call.args[0] for call in mock_stop.call_args_list) == ["kernel1", "kernel2"]
 
         # Verify connection directory was removed
         mock_connection_dir.rmdir.assert_called_once()
@@ -539,7 +480,7 @@ def test_cleanup_rmdir_error(kernel_manager):
     # Mock stop_kernel to avoid side effects
     with patch.object(kernel_manager, "stop_kernel"):
         # Mock rmdir to raise exception
-        mock_connection_dir = MagicMock()
+        mock_connection_dir = Mock()
         mock_connection_dir.rmdir.side_effect = Exception("Directory not empty")
         kernel_manager.connection_dir = mock_connection_dir
 
@@ -550,51 +491,28 @@ def test_cleanup_rmdir_error(kernel_manager):
         mock_connection_dir.rmdir.assert_called_once()
 
 
-def test_execute_code_with_different_output_types(kernel_manager):
+@pytest.mark.parametrize(
+    "messages,expected_outputs",
+    [
+        ([_EXECUTE_RESULT_MSG], [("execute_result", {"text/plain", "text/html", "image/png"})]),
+        ([_DISPLAY_DATA_MSG], [("display_data", {"image/svg+xml"})]),
+        (
+            [_EXECUTE_RESULT_MSG, _DISPLAY_DATA_MSG],
+            [("execute_result", {"text/plain", "text/html", "image/png"}), ("display_data", {"image/svg+xml"})],
+        ),
+    ],
+    ids=["execute_result", "display_data", "both"],
+)
+def test_execute_code_with_different_output_types(kernel_manager, make_kernel_entry, messages, expected_outputs):
     """Test execute_code with different output types."""
     kernel_id = "test-kernel"
 
-    # Set up a mock kernel
-    mock_client = MagicMock()
-    kernel_manager.kernels[kernel_id] = {
-        "client": mock_client,
-        "container": MagicMock(),
-        "connection_file": MagicMock(),
-        "client_file": MagicMock(),
-    }
-
-    # Configure mock to return different output types
-    def mock_get_iopub_msg(timeout=None):
-        if not hasattr(mock_get_iopub_msg, "call_count"):
-            mock_get_iopub_msg.call_count = 0
-
-        mock_get_iopub_msg.call_count += 1
-
-        if mock_get_iopub_msg.call_count == 1:
-            return {
-                "header": {"msg_type": "execute_result"},
-                "content": {"data": {"text/plain": "42", "text/html": "<b>42</b>", "image/png": "base64_image_data"}},
-            }
-        elif mock_get_iopub_msg.call_count == 2:
-            return {"header": {"msg_type": "display_data"}, "content": {"data": {"image/svg+xml": "<svg>...</svg>"}}}
-        else:
-            return {"header": {"msg_type": "status"}, "content": {"execution_state": "idle"}}
+    # Set up a mock kernel returning the given outputs before going idle
+    kernel = kernel_manager.kernels[kernel_id] = make_kernel_entry()
+    kernel["client"].get_iopub_msg.side_effect = [*messages, _IDLE_MSG]
 
-    mock_client.get_iopub_msg.side_effect = mock_get_iopub_msg
-
-    # Execute code
     result = kernel_manager.execute_code(kernel_id, "display(42)")
 
-    # Verify result contains different output types
+    # Verify the outputs keep their type and mime types, in order
     assert result["status"] == "completed"
-    assert len(result["outputs"]) == 2
-
-    # Check execute_result output
-    assert result["outputs"][0]["type"] == "execute_result"
-    assert "text/plain" in result["outputs"][0]["data"]
-    assert "text/html" in result["outputs"][0]["data"]
-    assert "image/png" in result["outputs"][0]["data"]
-
-    # Check display_data output
-    assert result["outputs"][1]["type"] == "display_data"
-    assert "image/svg+xml" in result["outputs"][1]["data"]
+    assert [(output["type"], set(output["data"])) for output in result["outputs"]] == expected_outputs
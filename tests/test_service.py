@@ -1,4 +1,5 @@
-from unittest.mock import AsyncMock, MagicMock, patch
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
 
 import pytest
 
@@ -6,25 +7,44 @@ from codeboxai.models import ExecutionOptions, ExecutionRequest
 from codeboxai.service import CodeExecutionService
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def mock_kernel_manager():
     with patch("codeboxai.service.KernelManager") as MockKM:
         yield MockKM
 
 
+@pytest.fixture(scope="module")
+def service(mock_kernel_manager):
+    return CodeExecutionService()
+
+
+@pytest.fixture
+def frozen_now(monkeypatch):
+    now = datetime(2024, 1, 1)
+    monkeypatch.setattr("codeboxai.service.datetime", Mock(utcnow=lambda: now))
+    return now
+
+
+@pytest.fixture(autouse=True)
+def reset_service(service):
+    service.sessions.clear()
+    service.requests.clear()
+    service.results.clear()
+    service.kernel_manager.reset_mock(return_value=True, side_effect=True)
+
+
 @pytest.mark.asyncio
-async def test_create_session_success(mock_kernel_manager):
-    service = CodeExecutionService()
+async def test_create_session_success(service, frozen_now):
     service.kernel_manager.start_kernel = MagicMock()
     service.kernel_manager.execute_code = MagicMock(return_value={"status": "ok", "outputs": [], "error": None})
     session_id = await service.create_session(["requests"], ExecutionOptions())
     assert session_id in service.sessions
     assert service.sessions[session_id]["dependencies"] == ["requests"]
+    assert service.sessions[session_id]["created_at"] == frozen_now.isoformat()
 
 
 @pytest.mark.asyncio
-async def test_create_session_dependency_error(mock_kernel_manager):
-    service = CodeExecutionService()
+async def test_create_session_dependency_error(service):
     service.kernel_manager.start_kernel = MagicMock()
     service.kernel_manager.execute_code = MagicMock(return_value={"status": "error", "error": "fail", "outputs": []})
     with pytest.raises(ValueError):
@@ -32,9 +52,8 @@ async def test_create_session_dependency_error(mock_kernel_manager):
 
 
 @pytest.mark.asyncio
-async def test_create_execution_request_creates_session(mock_kernel_manager):
-    service = CodeExecutionService()
-    service.create_session = AsyncMock(return_value="sid1")
+async def test_create_execution_request_creates_session(monkeypatch, service):
+    monkeypatch.setattr(service, "create_session", AsyncMock(return_value="sid1"))
     req = ExecutionRequest(code="print('hi')", session_id="sid1")
     request_id = await service.create_execution_request(req)
     assert request_id in service.requests
@@ -42,11 +61,15 @@ async def test_create_execution_request_creates_session(mock_kernel_manager):
 
 
 @pytest.mark.asyncio
-async def test_execute_code_success(mock_kernel_manager):
-    service = CodeExecutionService()
+async def test_execute_code_success(service, frozen_now):
     session_id = "sid1"
     request_id = "rid1"
-    service.sessions[session_id] = {"last_used": "", "created_at": "", "dependencies": [], "execution_options": {}}
+    service.sessions[session_id] = {
+        "last_used": frozen_now.isoformat(),
+        "created_at": frozen_now.isoformat(),
+        "dependencies": [],
+        "execution_options": {},
+    }
     service.requests[request_id] = {"session_id": session_id, "code": "print('hi')", "status": "initializing"}
     service.kernel_manager.execute_code = MagicMock(
         return_value={"status": "ok", "outputs": [{"type": "stream", "text": "hi\n"}], "error": None}
@@ -54,23 +77,29 @@ async def test_execute_code_success(mock_kernel_manager):
     await service.execute_code(request_id)
     assert service.results[request_id]["status"] == "ok"
     assert service.results[request_id]["output"][0]["content"] == "hi\n"
+    assert service.results[request_id]["completed_at"] == frozen_now.isoformat()
+    assert service.sessions[session_id]["last_used"] == frozen_now.isoformat()
 
 
 @pytest.mark.asyncio
-async def test_execute_code_error(mock_kernel_manager):
-    service = CodeExecutionService()
+async def test_execute_code_error(service, frozen_now):
     session_id = "sid1"
     request_id = "rid1"
-    service.sessions[session_id] = {"last_used": "", "created_at": "", "dependencies": [], "execution_options": {}}
+    service.sessions[session_id] = {
+        "last_used": frozen_now.isoformat(),
+        "created_at": frozen_now.isoformat(),
+        "dependencies": [],
+        "execution_options": {},
+    }
     service.requests[request_id] = {"session_id": session_id, "code": "raise Exception()", "status": "initializing"}
     service.kernel_manager.execute_code = MagicMock(side_effect=Exception("fail"))
     await service.execute_code(request_id)
     assert service.results[request_id]["status"] == "error"
     assert "fail" in service.results[request_id]["error"]
+    assert service.results[request_id]["completed_at"] == frozen_now.isoformat()
 
 
-def test_cleanup_session(mock_kernel_manager):
-    service = CodeExecutionService()
+def test_cleanup_session(service):
     session_id = "sid1"
     service.sessions[session_id] = {}
     service.kernel_manager.stop_kernel = MagicMock()